@@ -1,9 +1,14 @@
 import streamlit as st
-import streamlit.components.v1 as components
+import numpy as np
 import pandas as pd
 import datetime
+import hashlib
+import json
+import pathlib
+import queue
+import threading
+import time
 import gspread
-import plotly.graph_objects as go
 from google.oauth2.service_account import Credentials
 
 # ==============================
@@ -20,19 +25,29 @@ SPREADSHEET_ID = "1-4fTk-_YaVF5r7GWShZhYgYdAHe9DhJZV3Lxtwnxmdg"
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
+    # Drive is only touched for the modifiedTime metadata check.
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
 ]
 
 # ==============================
 # PERFORMANCE: cache auth + spreadsheet
 # ==============================
 @st.cache_resource(show_spinner=False)
-def get_gspread_client():
-    creds = Credentials.from_service_account_info(
+def get_credentials():
+    return Credentials.from_service_account_info(
         st.secrets["gcp_service_account"],
         scopes=SCOPES,
     )
-    return gspread.authorize(creds)
+
+@st.cache_resource(show_spinner=False)
+def get_gspread_client():
+    return gspread.authorize(get_credentials())
+
+@st.cache_resource(show_spinner=False)
+def get_drive_service():
+    # Deferred: googleapiclient is only needed for the metadata check.
+    from googleapiclient.discovery import build
+    return build("drive", "v3", credentials=get_credentials())
 
 @st.cache_resource(show_spinner=False)
 def get_spreadsheet():
@@ -47,25 +62,354 @@ def ws(title: str):
 # ==============================
 # PERFORMANCE: cached reads (prevents 429)
 # ==============================
+NUMERIC_COLS = {
+    "protein", "fat", "carbs", "calories", "weight_kg",
+    "protein_per_100g", "fat_per_100g", "carbs_per_100g", "calories_per_100g",
+}
+
+CATEGORY_COLS = {"food_name", "meal_name"}
+
+MACRO_COLS = ("protein", "fat", "carbs", "calories")
+
+CACHE_DIR = pathlib.Path.home() / ".cache" / "wedding_pfc"
+
+@st.cache_data(ttl=30, show_spinner=False)
+def sheet_modified_time() -> str:
+    """One cheap Drive metadata call instead of a full sheet fetch."""
+    meta = get_drive_service().files().get(
+        fileId=SPREADSHEET_ID, fields="modifiedTime"
+    ).execute()
+    return meta["modifiedTime"]
+
+# Bump when _rows_to_df changes what it parses/derives, so mirrors built
+# by an older parser refetch instead of serving a stale schema.
+_PARSER_VERSION = 2
+
+def _cache_path(ws_title: str) -> pathlib.Path:
+    digest = hashlib.sha1(f"{SPREADSHEET_ID}:{ws_title}".encode()).hexdigest()
+    return CACHE_DIR / f"{digest}.parquet"
+
+def _persist_df(df: pd.DataFrame, path: pathlib.Path, mtime: str, nrows: int,
+                last_row: list = None):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(path, compression="zstd")
+    path.with_suffix(".json").write_text(
+        json.dumps({
+            "mtime": mtime,
+            "rows": nrows,
+            "last_row": last_row,
+            "version": _PARSER_VERSION,
+            "schema": list(df.dtypes.astype(str)),
+        })
+    )
+
+def _read_sidecar(path: pathlib.Path):
+    meta_path = path.with_suffix(".json")
+    if not path.exists() or not meta_path.exists():
+        return None
+    try:
+        return json.loads(meta_path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _rows_to_df(rows: list) -> pd.DataFrame:
+    """Build a DataFrame from a raw 2D value range in one shot."""
+    if not rows:
+        return pd.DataFrame()
+    header = (
+        pd.Index(rows[0]).astype(str).str.strip().str.lower()
+        .str.replace(" ", "_", regex=False)
+    )
+    # The values API omits trailing empty cells, so data rows routinely
+    # come back narrower than the header; pad (and trim strays) to the
+    # header width or the DataFrame constructor raises.
+    width = len(header)
+    body = [list(r[:width]) + [None] * (width - len(r)) for r in rows[1:]]
+    df = pd.DataFrame(body, columns=header)
+    # float32 is plenty for kcal/gram precision and halves numeric bandwidth;
+    # category strings compare as integer codes instead of Python objects.
+    for col in NUMERIC_COLS & set(df.columns):
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+    for col in CATEGORY_COLS & set(df.columns):
+        df[col] = df[col].astype("category")
+    # Calories are derivable (4P + 9F + 4C), so new rows no longer persist
+    # them; derive here, keeping any value older rows did store.
+    if {"protein", "fat", "carbs"} <= set(df.columns):
+        derived = df.eval("protein * 4 + fat * 9 + carbs * 4")
+        if "calories" in df.columns:
+            df["calories"] = df["calories"].fillna(derived).astype("float32")
+        else:
+            df["calories"] = derived.astype("float32")
+    # Parse dates once here so no page ever re-runs to_datetime/dropna;
+    # the stable sort keeps date filters on O(log N) searchsorted slices.
+    if "date" in df.columns:
+        raw = df["date"]
+        if pd.api.types.is_numeric_dtype(raw):
+            # SERIAL_NUMBER rendering: days since the Sheets epoch, one
+            # C-level conversion instead of string parsing.
+            df["date"] = pd.to_datetime(raw, unit="D", origin="1899-12-30")
+        else:
+            # Hand-edited sheets mix date-typed cells (serial numbers)
+            # with text cells in one column; parse each kind with its own
+            # fast path instead of coercing the serials to NaT and losing
+            # those rows to the dropna below.
+            serial = pd.to_numeric(raw, errors="coerce")
+            parsed = pd.to_datetime(serial, unit="D", origin="1899-12-30")
+            text = pd.to_datetime(
+                raw.where(serial.isna()), format="%Y-%m-%d",
+                errors="coerce", cache=True,
+            )
+            df["date"] = parsed.fillna(text)
+        df = df.dropna(subset=["date"]).sort_values(
+            "date", kind="stable", ignore_index=True
+        )
+    return df
+
+SHEETS = ("Meals", "FoodDatabase", "Weights", "Workouts")
+
+# Fallback headers for optimistic overlays onto a sheet that has no rows
+# yet (an empty frame carries no columns to rebuild from).
+SHEET_HEADERS = {
+    "Meals": ["date", "time", "meal_name", "protein", "fat", "carbs",
+              "calories", "notes", "image_url"],
+    "Weights": ["date", "weight_kg"],
+    "Workouts": ["date", "workout_name", "youtube_link", "notes"],
+}
+
 @st.cache_data(ttl=60, show_spinner=False)
+def read_all_sheets() -> dict:
+    """Every sheet in one values.batchGet, parsed and parquet-persisted.
+
+    Each sheet mirrors to one parquet file whose sidecar records the
+    spreadsheet modifiedTime and raw row count. A matching mtime is a
+    pure local read; a stale Meals mirror refetches only its tail; the
+    rest share a single batchGet round trip.
+    """
+    mtime = sheet_modified_time()
+    dfs = {}
+    missing = []
+    for title in SHEETS:
+        path = _cache_path(title)
+        meta = _read_sidecar(path)
+        if meta and meta.get("version") != _PARSER_VERSION:
+            meta = None
+        if meta and meta.get("mtime") == mtime:
+            dfs[title] = pd.read_parquet(path)
+        elif title == "Meals" and meta and meta.get("rows") and meta.get("last_row"):
+            # Meals is append-only, so a stale mirror usually only needs
+            # the rows past its recorded count — one narrow range get
+            # instead of refetching the whole history. Fetch from the
+            # cursor row itself so the mirror's last row doubles as a
+            # checksum: a mismatch means something was edited or deleted
+            # behind the cursor and the count can't be trusted.
+            df = pd.read_parquet(path)
+            n = meta["rows"]
+            tail = ws(title).get(
+                f"A{n + 1}:Z",
+                value_render_option="UNFORMATTED_VALUE",
+                date_time_render_option="SERIAL_NUMBER",
+            )
+            if len(tail) > 1 and tail[0] == meta["last_row"]:
+                new_rows = tail[1:]
+                extra = _rows_to_df([df.columns.tolist(), *new_rows])
+                df = pd.concat([df, extra], ignore_index=True).sort_values(
+                    "date", kind="stable", ignore_index=True
+                )
+                _persist_df(df, path, mtime, n + len(new_rows), tail[-1])
+                dfs[title] = df
+            else:
+                # Shifted/missing overlap row, or mtime moved with no new
+                # rows: the edit/delete signature — refetch in full.
+                missing.append(title)
+        else:
+            missing.append(title)
+    if missing:
+        resp = sheet.values_batch_get(
+            [f"{t}!A:Z" for t in missing],
+            params={
+                "valueRenderOption": "UNFORMATTED_VALUE",
+                "dateTimeRenderOption": "SERIAL_NUMBER",
+            },
+        )
+        for title, vr in zip(missing, resp["valueRanges"]):
+            values = vr.get("values", [])
+            df = _rows_to_df(values)
+            _persist_df(
+                df, _cache_path(title), mtime, max(0, len(values) - 1),
+                values[-1] if len(values) > 1 else None,
+            )
+            dfs[title] = df
+    # Guarantee the macro schema once here so every downstream consumer
+    # can index the columns directly instead of branching on .get/reindex.
+    meals = dfs["Meals"]
+    if not meals.empty:
+        for col in MACRO_COLS:
+            if col not in meals.columns:
+                meals[col] = np.float32(0.0)
+    # The modifiedTime this batch was fetched under; the pending-write
+    # overlay compares against it rather than the live Drive value.
+    dfs["_mtime"] = mtime
+    return dfs
+
 def read_records(ws_title: str) -> pd.DataFrame:
-    records = ws(ws_title).get_all_records()
-    df = pd.DataFrame(records)
-    if not df.empty:
-        df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    return read_all_sheets()[ws_title]
+
+def read_records_cached(ws_title: str) -> pd.DataFrame:
+    """Within-session memo that returns the parsed DataFrame by reference.
+
+    st.cache_data re-hashes keys and copies the frame on every rerun; for
+    the hot sheets a session_state stash skips that entirely.
+    """
+    key = f"_df_{ws_title}"
+    stamp = st.session_state.get(key + "_t", 0.0)
+    now = time.monotonic()
+    if key in st.session_state and now - stamp < 60:
+        return st.session_state[key]
+    df = _merge_pending(ws_title, read_records(ws_title))
+    st.session_state[key] = df
+    st.session_state[key + "_t"] = now
     return df
 
+def get_daily_meals() -> pd.DataFrame:
+    """Daily macro totals plus streak flags, shared by every page.
+
+    Deliberately not st.cache_data: the input includes this session's
+    optimistic pending rows, which must not leak into a process-global
+    cache. The source frame is session-memoized and the totals are a
+    few reduceat passes, so recomputing per rerun is cheap.
+    """
+    daily = compute_daily_totals(read_records_cached("Meals"))
+    if daily.empty:
+        return daily
+    hit = daily["protein"].to_numpy() >= PROTEIN_TARGET
+    daily["hit_protein"] = hit
+    daily["perfect_day"] = hit & (daily["calories"].to_numpy() <= CAL_TARGET)
+    return daily
+
+@st.cache_data(ttl=300, show_spinner=False)
+def food_lookup():
+    """FoodDatabase as {name: per-gram macro array} for O(1) lookups."""
+    df = read_all_sheets()["FoodDatabase"]
+    if df.empty or "food_name" not in df.columns:
+        return {}, ()
+    # A tuple keeps the selectbox options reference-stable across reruns,
+    # letting Streamlit's widget-prop diff short-circuit.
+    names = tuple(df["food_name"].astype(str))
+    # Divide by 100 once here so the entry path is a bare array * grams.
+    macros = df[
+        ["protein_per_100g", "fat_per_100g", "carbs_per_100g", "calories_per_100g"]
+    ].to_numpy(dtype=np.float32) / np.float32(100.0)
+    return dict(zip(names, macros)), names
+
+_WRITE_ATTEMPTS = 3
+
+@st.cache_resource(show_spinner=False)
+def _dropped_writes() -> list:
+    """Rows the writer gave up on; the sidebar reports them next rerun."""
+    return []
+
+@st.cache_resource(show_spinner=False)
+def _write_queue() -> queue.Queue:
+    """One background worker per process that drains queued writes.
+
+    Each wakeup drains everything queued behind the first item, groups by
+    sheet and lands each group with a single append_rows call. A failed
+    batch re-queues after a short pause, but only _WRITE_ATTEMPTS times —
+    a permanent error (bad payload, 400) must not retry forever, so the
+    rows move to _dropped_writes() where the UI can surface the loss.
+    """
+    q = queue.Queue()
+
+    def _worker():
+        while True:
+            items = [q.get()]
+            try:
+                while True:
+                    items.append(q.get_nowait())
+            except queue.Empty:
+                pass
+            batches = {}
+            for title, row, attempts in items:
+                batches.setdefault(title, []).append((row, attempts))
+            for title, rows in batches.items():
+                try:
+                    ws(title).append_rows(
+                        [row for row, _ in rows], value_input_option="USER_ENTERED"
+                    )
+                except Exception:
+                    for row, attempts in rows:
+                        if attempts + 1 >= _WRITE_ATTEMPTS:
+                            _dropped_writes().append((title, row))
+                        else:
+                            q.put((title, row, attempts + 1))
+                    time.sleep(2)
+
+    threading.Thread(target=_worker, daemon=True).start()
+    return q
+
+def _merge_pending(ws_title: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Overlay writes still in flight so a refetch doesn't hide them.
+
+    A pending row is considered landed once the frame being served was
+    *fetched* under a modifiedTime newer than the one it was enqueued
+    against. Comparing against the live Drive value instead dropped rows
+    the moment any unrelated write advanced it, while the cached frame —
+    still from before the write — hid the row until the caches realigned.
+    """
+    pending = st.session_state.get("pending_writes", [])
+    if not pending:
+        return df
+    served = read_all_sheets()["_mtime"]
+    still_pending = [p for p in pending if p["mtime"] >= served]
+    st.session_state["pending_writes"] = still_pending
+    rows = [p["row"] for p in still_pending if p["sheet"] == ws_title]
+    if rows:
+        header = df.columns.tolist() if len(df.columns) else SHEET_HEADERS.get(ws_title)
+        if header:
+            tail = _rows_to_df([header, *rows])
+            df = tail if df.empty else pd.concat([df, tail], ignore_index=True)
+    return df
+
+# Derived caches to drop when a sheet changes; chart specs and the other
+# sheets' caches survive a write untouched. (Daily totals aren't here —
+# they recompute from the session frame every rerun.)
+CACHE_DEPS = {
+    "FoodDatabase": (food_lookup,),
+}
+
 def append_row(ws_title: str, row: list):
-    ws(ws_title).append_row(row, value_input_option="USER_ENTERED")
-    st.cache_data.clear()
+    """Optimistic append: update the in-memory frame now, write in background.
+
+    The UI reflects the new row immediately instead of blocking on the
+    Sheets round trip and re-fetching the whole sheet afterwards.
+    """
+    st.session_state.setdefault("pending_writes", []).append(
+        {"sheet": ws_title, "row": row, "mtime": read_all_sheets()["_mtime"]}
+    )
+    key = f"_df_{ws_title}"
+    df = st.session_state.get(key)
+    if df is not None:
+        header = df.columns.tolist() if len(df.columns) else SHEET_HEADERS.get(ws_title)
+        if header:
+            tail = _rows_to_df([header, row])
+            st.session_state[key] = (
+                tail if df.empty else pd.concat([df, tail], ignore_index=True)
+            )
+    for cached_fn in CACHE_DEPS.get(ws_title, ()):
+        cached_fn.clear()
+    _write_queue().put((ws_title, row, 0))
 
 # ==============================
 # UI STYLE
 # ==============================
 st.set_page_config(page_title="Wedding Cut Tracker", layout="centered")
 
-st.markdown(
-    """
+@st.cache_resource(show_spinner=False)
+def _css_blob() -> str:
+    # Built once per process; emitting the byte-identical string on every
+    # rerun lets the frontend diff skip the DOM update, so the @keyframes
+    # animations are parsed once instead of restarting per rerun.
+    return """
     <style>
     /* --- MAIN buttons: pink --- */
     section.main div.stButton > button {
@@ -162,9 +506,9 @@ st.markdown(
       animation: shimmer 1600ms linear infinite;
     }
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+
+st.markdown(_css_blob(), unsafe_allow_html=True)
 
 st.title("💍 Wedding Cut Dashboard")
 st.markdown("<h4 style='color:#ff7fb0;'>🦎 Lean & Lovely Mode Activated 💗</h4>", unsafe_allow_html=True)
@@ -176,27 +520,26 @@ PINK = "#ff9ecb"
 PINK_DARK = "#ff6fa5"
 BG = "#fff6fb"
 
-def cute_line_chart(df, x_col, y_col, title, goal=None, y_suffix=""):
+@st.cache_data(show_spinner=False)
+def _line_chart_spec(x: tuple, y: tuple, title, goal, y_suffix) -> dict:
+    """Build the figure once per unique dataset; reruns get the cached dict."""
+    # Deferred so non-chart pages don't pay Plotly's import cost on every
+    # rerun; after the first chart it's a sys.modules hit.
+    import plotly.graph_objects as go
+
     fig = go.Figure()
 
+    # One trace carries line, markers and fill: half the diff Plotly has
+    # to reconcile on update.
     fig.add_trace(go.Scatter(
-        x=df[x_col],
-        y=df[y_col],
+        x=x,
+        y=y,
         mode="lines+markers",
         line=dict(color=PINK_DARK, width=4, shape="spline"),
         marker=dict(size=9, color=PINK),
-        name=title
-    ))
-
-    fig.add_trace(go.Scatter(
-        x=df[x_col],
-        y=df[y_col],
-        mode="lines",
-        line=dict(width=0),
         fill="tozeroy",
         fillcolor="rgba(255, 158, 203, 0.18)",
-        hoverinfo="skip",
-        name=""
+        name=title
     ))
 
     if goal is not None:
@@ -215,11 +558,19 @@ def cute_line_chart(df, x_col, y_col, title, goal=None, y_suffix=""):
         margin=dict(l=10, r=10, t=40, b=10),
         height=320,
         font=dict(size=14, color="#4a4a4a"),
-        showlegend=False
+        showlegend=False,
+        uirevision=title,  # stable per chart: reruns diff, not rebuild
     )
     fig.update_xaxes(showgrid=False, zeroline=False)
     fig.update_yaxes(showgrid=True, gridcolor="rgba(255, 158, 203, 0.15)", zeroline=False)
-    return fig
+    return fig.to_dict()
+
+def cute_line_chart(df, x_col, y_col, title, goal=None, y_suffix=""):
+    import plotly.graph_objects as go
+
+    # Tuples are hashable, so unchanged data hits the cached spec.
+    spec = _line_chart_spec(tuple(df[x_col]), tuple(df[y_col]), title, goal, y_suffix)
+    return go.Figure(spec)
 
 def cute_xp_card(label, value, target, emoji="🦎"):
     ratio = 0 if target == 0 else min(max(value / target, 0), 1)
@@ -257,6 +608,9 @@ def cute_xp_card(label, value, target, emoji="🦎"):
 # EFFECTS + BADGES HELPERS
 # ==============================
 def confetti():
+    # Deferred like plotly: only FX emitters pay the component-module cost.
+    import streamlit.components.v1 as components
+
     js = """
     <canvas id="confetti" style="position:fixed;inset:0;pointer-events:none;z-index:9999;"></canvas>
     <script>
@@ -302,10 +656,12 @@ def confetti():
     """
     components.html(js, height=0)
 
-def play_badge_sound(enabled: bool):
-    if not enabled:
-        return
-    audio_html = """
+@st.cache_resource(show_spinner=False)
+def _badge_sound_html() -> str:
+    # The audio element and its trigger live in the same iframe document,
+    # so they must ship together; the base64 payload is at least built and
+    # decoded only once per process.
+    return """
     <audio id="badgepop">
       <source src="data:audio/wav;base64,UklGRl4AAABXQVZFZm10IBAAAAABAAEAESsAACJWAAACABAAZGF0YToAAAAA/////wAAAP///wAAAP///wAAAP///wAAAP///wAA" type="audio/wav">
     </audio>
@@ -314,62 +670,89 @@ def play_badge_sound(enabled: bool):
       if (a) { a.volume = 0.6; a.play().catch(()=>{}); }
     </script>
     """
-    components.html(audio_html, height=0)
+
+def play_badge_sound(enabled: bool):
+    if not enabled:
+        return
+    import streamlit.components.v1 as components
+
+    components.html(_badge_sound_html(), height=0)
 
 def compute_daily_totals(meals: pd.DataFrame) -> pd.DataFrame:
     if meals is None or meals.empty:
         return pd.DataFrame()
     if "date" not in meals.columns:
         return pd.DataFrame()
-    m = meals.copy()
-    m["date"] = pd.to_datetime(m["date"], errors="coerce")
-    m = m.dropna(subset=["date"])
-    daily = m.groupby(m["date"].dt.date).sum(numeric_only=True)
-    daily.index = pd.to_datetime(daily.index)
-    return daily.sort_index()
+    # The loader guarantees date-sorted rows, so days form contiguous runs
+    # and daily sums are one np.add.reduceat per macro column — no hashed
+    # groupby, no Python date objects as keys.
+    days = meals["date"].to_numpy().astype("datetime64[D]")
+    edges = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    # No copy=False: under pandas copy-on-write to_numpy() hands back a
+    # read-only view and in-place nan_to_num raises.
+    totals = {
+        c: np.add.reduceat(np.nan_to_num(meals[c].to_numpy(dtype=np.float32)), edges)
+        for c in MACRO_COLS
+    }
+    return pd.DataFrame(totals, index=pd.DatetimeIndex(days[edges], name="date"))
 
 def current_streak(daily: pd.DataFrame, condition_col: str) -> int:
     if daily.empty or condition_col not in daily.columns:
         return 0
     today = pd.to_datetime(datetime.date.today())
-    streak = 0
-    day = today
-    while True:
-        if (day in daily.index) and bool(daily.loc[day, condition_col]):
-            streak += 1
-            day = day - pd.Timedelta(days=1)
-        else:
-            break
-    return streak
+    # Ignore future-dated rows (hand-edited sheet dates) so the period
+    # count below can't go non-positive.
+    daily = daily.loc[:today]
+    if daily.empty:
+        return 0
+    # Fill the calendar up to today, then count the trailing run of True
+    # days with one reversed argmin instead of per-day .loc lookups.
+    days = pd.date_range(end=today, periods=(today - daily.index.min()).days + 1, freq="D")
+    hits = daily[condition_col].reindex(days, fill_value=False).astype(bool).to_numpy()
+    return int(len(hits)) if hits.all() else int(np.argmin(hits[::-1]))
+
+STREAK_BADGES = (
+    (3, "🔥 3-Day Streak"),
+    (7, "💎 7-Day Streak"),
+    (14, "👑 14-Day Streak"),
+)
+
+RARITY_BG = {
+    "🥚 First Log": "linear-gradient(90deg,#9ad7ff,#c7eaff)",
+    "🦎 Protein Boss": "linear-gradient(90deg,#ff6fa5,#ff9ecb,#ffd1e8)",
+    "🌸 Perfect Day": "linear-gradient(90deg,#ff4f93,#ff9ecb,#fff2f8)",
+    "🔥 3-Day Streak": "linear-gradient(90deg,#ff6a00,#ff4f93,#ff9ecb)",
+    "💎 7-Day Streak": "linear-gradient(90deg,#6a5cff,#ff6fa5,#ffd1e8)",
+    "👑 14-Day Streak": "linear-gradient(90deg,#f7b500,#ff6fa5,#ffd1e8)",
+}
+
+@st.cache_data(show_spinner=False)
+def _render_badges_html(badges: tuple) -> str:
+    chips = []
+    for b in badges:
+        bg = RARITY_BG.get(b, "linear-gradient(90deg,#ff6fa5,#ff9ecb)")
+        shimmer_class = " shimmer" if any(x in b for x in ["💎", "👑", "🌸"]) else ""
+        chips.append(f'<span class="badge-chip{shimmer_class}" style="background:{bg};">{b}</span>')
+    return '<div class="badge-wrap">' + "".join(chips) + "</div>"
 
 def render_badges(badges):
     if not badges:
         st.info("No badges yet — log meals to start! ✨")
         return
-
-    rarity_bg = {
-        "🥚 First Log": "linear-gradient(90deg,#9ad7ff,#c7eaff)",
-        "🦎 Protein Boss": "linear-gradient(90deg,#ff6fa5,#ff9ecb,#ffd1e8)",
-        "🌸 Perfect Day": "linear-gradient(90deg,#ff4f93,#ff9ecb,#fff2f8)",
-        "🔥 3-Day Streak": "linear-gradient(90deg,#ff6a00,#ff4f93,#ff9ecb)",
-        "💎 7-Day Streak": "linear-gradient(90deg,#6a5cff,#ff6fa5,#ffd1e8)",
-        "👑 14-Day Streak": "linear-gradient(90deg,#f7b500,#ff6fa5,#ffd1e8)",
-    }
-
-    chips = '<div class="badge-wrap">'
-    for b in badges:
-        bg = rarity_bg.get(b, "linear-gradient(90deg,#ff6fa5,#ff9ecb)")
-        shimmer_class = " shimmer" if any(x in b for x in ["💎", "👑", "🌸"]) else ""
-        chips += f'<span class="badge-chip{shimmer_class}" style="background:{bg};">{b}</span>'
-    chips += "</div>"
-    st.markdown(chips, unsafe_allow_html=True)
+    st.markdown(_render_badges_html(tuple(badges)), unsafe_allow_html=True)
 
 # ==============================
 # COUNTDOWN
 # ==============================
-days_left = (WEDDING_DATE - datetime.date.today()).days
+@st.cache_data(ttl=3600, show_spinner=False)
+def _countdown(today: datetime.date):
+    """(days_left, progress ratio) — only changes once per day."""
+    days_left = (WEDDING_DATE - today).days
+    return days_left, max(0, min(1, 1 - days_left / 365))
+
+days_left, countdown_ratio = _countdown(datetime.date.today())
 st.subheader(f"{days_left} days until June 23, 2026")
-st.progress(max(0, min(1, 1 - days_left / 365)))
+st.progress(countdown_ratio)
 
 # ==============================
 # SIDEBAR: mascot + controls
@@ -396,8 +779,23 @@ if st.sidebar.button("🔔 Enable sound (tap once)"):
 
 if st.sidebar.button("🔄 Refresh data"):
     st.cache_data.clear()
+    # Invalidate the on-disk mirrors and the per-session frame memos too,
+    # so a refresh actually refetches instead of serving the stale session
+    # copy for another minute or being masked by the incremental fetch.
+    for _title in SHEETS:
+        _cache_path(_title).with_suffix(".json").unlink(missing_ok=True)
+        st.session_state.pop(f"_df_{_title}", None)
+        st.session_state.pop(f"_df_{_title}_t", None)
     st.toast("Refreshed ✨")
 
+dropped = _dropped_writes()
+if dropped:
+    names = ", ".join(sorted({title for title, _ in dropped}))
+    st.sidebar.error(f"⚠️ {len(dropped)} entry(ies) failed to save to {names} — please re-add them.")
+    if st.sidebar.button("Dismiss", key="dismiss_dropped"):
+        dropped.clear()
+        st.rerun()
+
 # ==============================
 # SIDEBAR NAV: categories (buttons) + pages (radio)
 # ==============================
@@ -422,14 +820,69 @@ elif group == "Stats":
 else:
     page = st.sidebar.radio("", ["Weight Progress", "Workouts"], label_visibility="collapsed")
 
+# ==============================
+# WEEK / MONTH / YEAR SUMMARY
+# ==============================
+SUMMARY_SCOPES = {
+    "week": ("🦎 Weekly Summary", "Weekly", "%a %m/%d", "🌸 Weekly Calories Trail", "chart-week"),
+    "month": ("🌸 Monthly Summary", "Monthly", "%m/%d", "✨ Monthly Calories Map", "chart-month"),
+    "year": ("✨ Yearly Summary", "Yearly", None, "🗺️ Yearly Calories Quest", "chart-year"),
+}
+
+def render_summary(scope: str):
+    """One body for the three summary pages; only the window and labels
+    differ, so they share the cached daily frame and chart plumbing."""
+    header, label, date_fmt, chart_title, chart_key = SUMMARY_SCOPES[scope]
+    st.subheader(header)
+
+    all_daily = get_daily_meals()
+    if all_daily.empty:
+        st.info("No meal history yet.")
+        return
+
+    today_dt = pd.to_datetime(datetime.date.today())
+    if scope == "week":
+        daily = all_daily.loc[today_dt - pd.Timedelta(days=today_dt.weekday()):]
+    elif scope == "month":
+        month_start = today_dt.replace(day=1)
+        daily = all_daily.loc[month_start:month_start + pd.offsets.MonthEnd(0)]
+    else:
+        daily = all_daily.loc[f"{today_dt.year}-01-01":f"{today_dt.year}-12-31"]
+
+    if daily.empty:
+        st.info(f"No meals logged this {scope} yet.")
+        return
+
+    if scope == "year":
+        monthly = daily.groupby(daily.index.month)[list(MACRO_COLS)].sum().reset_index()
+        monthly.rename(columns={"date": "month"}, inplace=True)
+        monthly["month_str"] = monthly["month"].apply(lambda m: f"{int(m)}月")
+        st.plotly_chart(
+            cute_line_chart(monthly, "month_str", "calories", chart_title),
+            use_container_width=True,
+            key=chart_key,
+        )
+        return
+
+    cute_xp_card(f"{label} Avg Calories", daily["calories"].mean(), CAL_TARGET, "💗")
+    cute_xp_card(f"{label} Avg Protein", daily["protein"].mean(), PROTEIN_TARGET, "🦎")
+
+    d = daily.reset_index()
+    d["date_str"] = d["date"].dt.strftime(date_fmt)
+    st.plotly_chart(
+        cute_line_chart(d, "date_str", "calories", chart_title, goal=CAL_TARGET, y_suffix=" kcal"),
+        use_container_width=True,
+        key=chart_key,
+    )
+
 # ==============================
 # TODAY LOG
 # ==============================
 if page == "Today Log":
-    today = str(datetime.date.today())
+    today = datetime.date.today().isoformat()
+    now_iso = datetime.datetime.now().isoformat(timespec="seconds")
 
-    meals_all = read_records("Meals")
-    daily = compute_daily_totals(meals_all)
+    daily = get_daily_meals()
 
     st.markdown("## 🎮 Gecko Quest Status")
     st.markdown(
@@ -442,9 +895,6 @@ if page == "Today Log":
     )
 
     if not daily.empty:
-        daily["hit_protein"] = daily.get("protein", 0) >= PROTEIN_TARGET
-        daily["perfect_day"] = (daily.get("protein", 0) >= PROTEIN_TARGET) & (daily.get("calories", 0) <= CAL_TARGET)
-
         protein_streak = current_streak(daily, "hit_protein")
         perfect_streak = current_streak(daily, "perfect_day")
 
@@ -455,22 +905,23 @@ if page == "Today Log":
             cute_xp_card("Perfect Day Streak", perfect_streak, 7, "💗")
 
         today_dt = pd.to_datetime(datetime.date.today())
-        today_row = daily.loc[today_dt] if today_dt in daily.index else None
+        # One hashed .loc probe instead of a membership scan plus lookup.
+        try:
+            today_row = daily.loc[today_dt]
+        except KeyError:
+            today_row = None
 
         unlocked = ["🥚 First Log"]
 
         if today_row is not None:
-            if float(today_row.get("protein", 0)) >= PROTEIN_TARGET:
+            if float(today_row["protein"]) >= PROTEIN_TARGET:
                 unlocked.append("🦎 Protein Boss")
-            if (float(today_row.get("protein", 0)) >= PROTEIN_TARGET) and (float(today_row.get("calories", 0)) <= CAL_TARGET):
+            if (float(today_row["protein"]) >= PROTEIN_TARGET) and (float(today_row["calories"]) <= CAL_TARGET):
                 unlocked.append("🌸 Perfect Day")
 
-        if protein_streak >= 3:
-            unlocked.append("🔥 3-Day Streak")
-        if protein_streak >= 7:
-            unlocked.append("💎 7-Day Streak")
-        if protein_streak >= 14:
-            unlocked.append("👑 14-Day Streak")
+        unlocked.extend(
+            label for threshold, label in STREAK_BADGES if protein_streak >= threshold
+        )
 
         st.markdown("### 🏆 Badges Unlocked")
         render_badges(unlocked)
@@ -483,198 +934,147 @@ if page == "Today Log":
             st.toast("✨ Badge unlocked!", icon="🏆")
             play_badge_sound(sound_on)
 
-            if "🌸 Perfect Day" in unlocked:
+            # Confetti keeps its own one-shot key: a 140-particle rAF loop
+            # should run once per actual unlock, never per rerun.
+            if "🌸 Perfect Day" in unlocked and st.session_state.get("confetti_fired_key") != key:
                 confetti()
+                st.session_state["confetti_fired_key"] = key
 
             st.session_state["badge_pop_key"] = key
     else:
         st.info("Log your first meal to start streaks and unlock badges! 🦎✨")
 
-    # Smart Food Entry
-    st.subheader("🦎 Smart Food Entry")
-
-    food_data = read_records("FoodDatabase")
-    if food_data.empty or "food_name" not in food_data.columns:
-        st.error("FoodDatabase is empty or headers are wrong. Column A must be 'food_name'.")
-        st.stop()
-
-    food_names = food_data["food_name"].astype(str).tolist()
-    selected_food = st.selectbox("Select Food", food_names)
-    grams = st.number_input("Grams", min_value=0, step=1)
-
-    if selected_food and grams > 0:
-        food_row = food_data[food_data["food_name"].astype(str) == str(selected_food)].iloc[0]
-        protein = (grams / 100) * float(food_row["protein_per_100g"])
-        fat = (grams / 100) * float(food_row["fat_per_100g"])
-        carbs = (grams / 100) * float(food_row["carbs_per_100g"])
-        calories = (grams / 100) * float(food_row["calories_per_100g"])
-
-        st.write(f"Protein: {protein:.1f}g")
-        st.write(f"Fat: {fat:.1f}g")
-        st.write(f"Carbs: {carbs:.1f}g")
-        st.write(f"Calories: {calories:.1f} kcal")
+    # Each block is a fragment so widget interactions rerun only that
+    # block; the entry forms below also batch keystrokes until Submit.
+    @st.fragment
+    def smart_entry():
+        st.subheader("🦎 Smart Food Entry")
+
+        # The sheets arrive in one batchGet either way, but the lookup
+        # table and the (potentially large) selectbox only get built when
+        # smart entry is actually in use.
+        if not st.toggle("Look up from FoodDatabase", key="smart_entry_on"):
+            return
+
+        food_table, food_names = food_lookup()
+        if not food_table:
+            st.error("FoodDatabase is empty or headers are wrong. Column A must be 'food_name'.")
+            return
+
+        # A form batches the widgets into one rerun on Submit instead of
+        # one per keystroke; the macro math runs only on that rerun.
+        with st.form("smart_entry", border=False):
+            selected_food = st.selectbox("Select Food", food_names)
+            grams = st.number_input("Grams", min_value=0, step=1)
+            submitted = st.form_submit_button("Add Smart Entry")
+
+        if submitted and selected_food and grams > 0:
+            # .tolist() yields Python floats — np.float32 would survive
+            # round() and later choke gspread's JSON encoding.
+            protein, fat, carbs, calories = (food_table[selected_food] * grams).tolist()
 
-        if st.button("Add Smart Entry"):
             append_row("Meals", [
                 today,
-                str(datetime.datetime.now()),
+                now_iso,
                 str(selected_food),
                 round(protein, 1),
                 round(fat, 1),
                 round(carbs, 1),
-                round(calories, 1),
+                "",  # calories derived on read
                 "",
                 ""
             ])
-            st.success("Meal added!")
-
-    # Manual Entry
-    st.subheader("🍓 Manual Entry")
-
-    meal_name = st.text_input("Meal Name")
-    protein_m = st.number_input("Protein (g)", min_value=0.0, step=1.0)
-    fat_m = st.number_input("Fat (g)", min_value=0.0, step=1.0)
-    carbs_m = st.number_input("Carbs (g)", min_value=0.0, step=1.0)
-
-    calories_m = protein_m * 4 + fat_m * 9 + carbs_m * 4
-    st.write(f"Calories: {calories_m:.1f} kcal")
-
-    if st.button("Add Manual Entry"):
-        append_row("Meals", [
-            today,
-            str(datetime.datetime.now()),
-            meal_name,
-            protein_m,
-            fat_m,
-            carbs_m,
-            calories_m,
-            "",
-            ""
-        ])
-        st.success("Manual meal added!")
-
-    # Today's Summary
-    st.subheader("💗 Today's Summary")
-
-    meals = read_records("Meals")
-    if meals.empty:
-        st.info("No meals yet today.")
-    else:
-        if "date" not in meals.columns:
-            st.error("Meals sheet must have a column named 'date'.")
-            st.stop()
-
-        df_today = meals[meals["date"].astype(str) == today]
-        if df_today.empty:
-            st.info("No meals logged for today yet.")
-        else:
-            total_p = float(df_today.get("protein", 0).sum())
-            total_f = float(df_today.get("fat", 0).sum())
-            total_c = float(df_today.get("carbs", 0).sum())
-            total_cal = float(df_today.get("calories", 0).sum())
+            # A toast survives the rerun below; inline st.write/success
+            # here would be wiped before the user ever saw it.
+            st.toast(
+                f"Added {selected_food}: {protein:.1f}P · {fat:.1f}F · {carbs:.1f}C · {calories:.0f} kcal",
+                icon="🦎",
+            )
+            st.rerun()
 
-            cute_xp_card("Protein Today", total_p, PROTEIN_TARGET, "🦎")
-            cute_xp_card("Calories Today", total_cal, CAL_TARGET, "💗")
+    @st.fragment
+    def manual_entry():
+        st.subheader("🍓 Manual Entry")
 
-            st.write(f"Fat: {total_f:.1f} / {FAT_TARGET}  (Remaining: {max(0, FAT_TARGET-total_f):.1f} g)")
-            st.write(f"Carbs: {total_c:.1f} / {CARB_TARGET}  (Remaining: {max(0, CARB_TARGET-total_c):.1f} g)")
+        with st.form("manual_entry", border=False):
+            meal_name = st.text_input("Meal Name")
+            protein_m = st.number_input("Protein (g)", min_value=0.0, step=1.0)
+            fat_m = st.number_input("Fat (g)", min_value=0.0, step=1.0)
+            carbs_m = st.number_input("Carbs (g)", min_value=0.0, step=1.0)
+            submitted = st.form_submit_button("Add Manual Entry")
 
-            protein_score = min(total_p / PROTEIN_TARGET, 1)
-            calorie_score = min(total_cal / CAL_TARGET, 1)
-            fat_score = 1 - min(total_f / FAT_TARGET, 1)
-            score = (protein_score * 0.5 + calorie_score * 0.3 + fat_score * 0.2) * 100
-            st.subheader(f"✨ Today's Score: {int(score)} / 100")
+        if submitted:
+            calories_m = protein_m * 4 + fat_m * 9 + carbs_m * 4
+            append_row("Meals", [
+                today,
+                now_iso,
+                meal_name,
+                protein_m,
+                fat_m,
+                carbs_m,
+                "",  # calories derived on read
+                "",
+                ""
+            ])
+            st.toast(f"Added {meal_name or 'meal'}: {calories_m:.0f} kcal", icon="🍓")
+            st.rerun()
 
-# ==============================
-# WEEK SUMMARY
-# ==============================
-elif page == "Week Summary":
-    st.subheader("🦎 Weekly Summary")
+    @st.fragment
+    def today_summary():
+        st.subheader("💗 Today's Summary")
 
-    meals = read_records("Meals")
-    if meals.empty:
-        st.info("No meal history yet.")
-    else:
-        meals["date"] = pd.to_datetime(meals["date"], errors="coerce")
-        meals = meals.dropna(subset=["date"])
+        meals = read_records_cached("Meals")
+        if meals.empty:
+            st.info("No meals yet today.")
+            return
+        if "date" not in meals.columns:
+            st.error("Meals sheet must have a column named 'date'.")
+            return
+
+        # Dates are kept sorted by the loader, so today's rows are a
+        # binary-searched slice instead of a full-column scan.
+        date_arr = meals["date"].to_numpy()
+        today64 = np.datetime64(today)
+        lo = np.searchsorted(date_arr, today64, "left")
+        hi = np.searchsorted(date_arr, today64 + np.timedelta64(1, "D"), "left")
+        df_today = meals.iloc[lo:hi]
+        if df_today.empty:
+            st.info("No meals logged for today yet.")
+            return
+
+        # One pass over the macro columns; ratios/remaining come out of the
+        # same vectorized ops instead of four scalar min/max rounds.
+        totals = np.nan_to_num(
+            df_today[list(MACRO_COLS)].to_numpy(dtype=np.float32)
+        ).sum(axis=0)
+        targets = np.array(
+            [PROTEIN_TARGET, FAT_TARGET, CARB_TARGET, CAL_TARGET], dtype=np.float32
+        )
+        ratios = np.minimum(totals / targets, 1.0)
+        remaining = np.maximum(targets - totals, 0.0)
+        total_p, total_f, total_c, total_cal = totals
 
-        today_dt = pd.to_datetime(datetime.date.today())
-        week_start = today_dt - pd.Timedelta(days=today_dt.weekday())
-        week_data = meals[meals["date"] >= week_start]
+        cute_xp_card("Protein Today", total_p, PROTEIN_TARGET, "🦎")
+        cute_xp_card("Calories Today", total_cal, CAL_TARGET, "💗")
 
-        if week_data.empty:
-            st.info("No meals logged this week yet.")
-        else:
-            daily = week_data.groupby("date").sum(numeric_only=True)
-            cute_xp_card("Weekly Avg Calories", daily["calories"].mean(), CAL_TARGET, "💗")
-            if "protein" in daily.columns:
-                cute_xp_card("Weekly Avg Protein", daily["protein"].mean(), PROTEIN_TARGET, "🦎")
-
-            d = daily.reset_index()
-            d["date_str"] = pd.to_datetime(d["date"]).dt.strftime("%a %m/%d")
-            st.plotly_chart(
-                cute_line_chart(d, "date_str", "calories", "🌸 Weekly Calories Trail", goal=CAL_TARGET, y_suffix=" kcal"),
-                use_container_width=True
-            )
+        st.write(f"Fat: {total_f:.1f} / {FAT_TARGET}  (Remaining: {remaining[1]:.1f} g)")
+        st.write(f"Carbs: {total_c:.1f} / {CARB_TARGET}  (Remaining: {remaining[2]:.1f} g)")
 
-# ==============================
-# MONTH SUMMARY
-# ==============================
-elif page == "Month Summary":
-    st.subheader("🌸 Monthly Summary")
+        score = float(ratios[0] * 0.5 + ratios[3] * 0.3 + (1 - ratios[1]) * 0.2) * 100
+        st.subheader(f"✨ Today's Score: {int(score)} / 100")
 
-    meals = read_records("Meals")
-    if meals.empty:
-        st.info("No meal history yet.")
-    else:
-        meals["date"] = pd.to_datetime(meals["date"], errors="coerce")
-        meals = meals.dropna(subset=["date"])
+    smart_entry()
+    manual_entry()
+    today_summary()
 
-        today_dt = pd.to_datetime(datetime.date.today())
-        this_month = meals[(meals["date"].dt.month == today_dt.month) & (meals["date"].dt.year == today_dt.year)]
+elif page == "Week Summary":
+    render_summary("week")
 
-        if this_month.empty:
-            st.info("No meals logged this month yet.")
-        else:
-            daily = this_month.groupby("date").sum(numeric_only=True)
-            cute_xp_card("Monthly Avg Calories", daily["calories"].mean(), CAL_TARGET, "💗")
-            if "protein" in daily.columns:
-                cute_xp_card("Monthly Avg Protein", daily["protein"].mean(), PROTEIN_TARGET, "🦎")
-
-            d = daily.reset_index()
-            d["date_str"] = pd.to_datetime(d["date"]).dt.strftime("%m/%d")
-            st.plotly_chart(
-                cute_line_chart(d, "date_str", "calories", "✨ Monthly Calories Map", goal=CAL_TARGET, y_suffix=" kcal"),
-                use_container_width=True
-            )
+elif page == "Month Summary":
+    render_summary("month")
 
-# ==============================
-# YEAR SUMMARY
-# ==============================
 elif page == "Year Summary":
-    st.subheader("✨ Yearly Summary")
-
-    meals = read_records("Meals")
-    if meals.empty:
-        st.info("No meal history yet.")
-    else:
-        meals["date"] = pd.to_datetime(meals["date"], errors="coerce")
-        meals = meals.dropna(subset=["date"])
-
-        today_dt = pd.to_datetime(datetime.date.today())
-        this_year = meals[meals["date"].dt.year == today_dt.year]
-
-        if this_year.empty:
-            st.info("No meals logged this year yet.")
-        else:
-            monthly = this_year.groupby(this_year["date"].dt.month).sum(numeric_only=True).reset_index()
-            monthly.rename(columns={"date": "month"}, inplace=True)
-            monthly["month_str"] = monthly["month"].apply(lambda m: f"{int(m)}月")
-
-            st.plotly_chart(
-                cute_line_chart(monthly, "month_str", "calories", "🗺️ Yearly Calories Quest"),
-                use_container_width=True
-            )
+    render_summary("year")
 
 # ==============================
 # WEIGHT
@@ -685,19 +1085,18 @@ elif page == "Weight Progress":
     weight = st.number_input("Weight (kg)", min_value=0.0, step=0.1)
 
     if st.button("Save Weight"):
-        append_row("Weights", [str(datetime.date.today()), weight])
+        append_row("Weights", [datetime.date.today().isoformat(), weight])
         st.success("Weight saved!")
 
-    weights = read_records("Weights")
+    weights = read_records_cached("Weights")
     if not weights.empty and "date" in weights.columns and "weight_kg" in weights.columns:
-        weights["date"] = pd.to_datetime(weights["date"], errors="coerce")
-        weights = weights.dropna(subset=["date"]).sort_values("date")
         w = weights.copy()
         w["date_str"] = w["date"].dt.strftime("%m/%d")
 
         st.plotly_chart(
             cute_line_chart(w, "date_str", "weight_kg", "⚖️ Weight Journey", y_suffix=" kg"),
-            use_container_width=True
+            use_container_width=True,
+            key="chart-weight"
         )
     else:
         st.info("No weight history yet.")
@@ -713,10 +1112,10 @@ elif page == "Workouts":
     notes = st.text_area("Notes")
 
     if st.button("Save Workout"):
-        append_row("Workouts", [str(datetime.date.today()), workout_name, youtube_link, notes])
+        append_row("Workouts", [datetime.date.today().isoformat(), workout_name, youtube_link, notes])
         st.success("Workout saved!")
 
-    workouts = read_records("Workouts")
+    workouts = read_records_cached("Workouts")
     if not workouts.empty:
         st.dataframe(workouts)
     else: